@@ -3,8 +3,10 @@ from __future__ import annotations
 import decimal
 from decimal import Decimal
 from enum import Enum, auto
+from functools import lru_cache
 from typing import List
 
+import ciso8601
 import yaml
 
 from src.util.funding_service import FundingServiceConfig
@@ -199,6 +201,19 @@ class Config:
         )
 
 
+@lru_cache(maxsize=8192, typed=True)
+def _cached_decimal(number: float | int | str) -> Decimal:
+    return Decimal(str(number))
+
+
+def to_decimal(number: float | int | str | Decimal) -> Decimal:
+    """Cached Decimal(str(number)), exchange sizes and prices repeat a lot. A Decimal
+    is returned as is"""
+    if type(number) is Decimal:
+        return number
+    return _cached_decimal(number)
+
+
 def to_decimal_or_none(number: float | int | str) -> Decimal | None:
     if isinstance(number, (float, int)):
         return Decimal(str(number))
@@ -209,3 +224,8 @@ def to_decimal_or_none(number: float | int | str) -> Decimal | None:
             return None
     else:
         return None
+
+
+def iso_to_timestamp(time_str: str) -> float:
+    """Timestamp of an ISO 8601 time string, e.g. 2022-07-01T08:00:00+00:00"""
+    return ciso8601.parse_datetime(time_str).timestamp()
@@ -6,7 +6,7 @@ from src.exchange.exchange_data_type import (CandleResolution, HedgePair,
                                              TradeType)
 
 
-@dataclass
+@dataclass(slots=True)
 class BinanceUSDTQuaterHedgePair(HedgePair):
     coin: str
     spot: str
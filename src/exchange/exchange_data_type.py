@@ -13,7 +13,7 @@ class TradeType(Enum):
     NEITHER = "neither"
 
 
-@dataclass
+@dataclass(slots=True)
 class HedgePair:
     coin: str
     spot: str
@@ -4,7 +4,8 @@ import time
 from dataclasses import dataclass
 from decimal import Decimal
 from enum import Enum
-from typing import Union
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
 
 from src.common import to_decimal_or_none
 from src.exchange.exchange_data_type import (CandleResolution, HedgePair, Side,
@@ -58,7 +59,7 @@ class FtxCandleResolution(CandleResolution):
             return "1D"
 
 
-@dataclass
+@dataclass(slots=True)
 class FtxTradingRule:
     symbol: str
     min_order_size: Decimal
@@ -104,19 +105,19 @@ class Ftx_EWMA_InterestRate:
         self.taker_fee_rate = taker_fee_rate
 
 
-@dataclass
+@dataclass(slots=True)
 class FtxFeeRate:
     taker_fee_rate: Decimal = None
     maker_fee_rate: Decimal = None
 
 
-@dataclass
+@dataclass(slots=True)
 class FtxCollateralWeight:
     coin: str
     weight: Decimal
 
 
-@dataclass
+@dataclass(slots=True)
 class FtxHedgePair(HedgePair):
     coin: str
     spot: str
@@ -124,26 +125,32 @@ class FtxHedgePair(HedgePair):
     trade_type: TradeType = TradeType.BOTH
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def coin_to_spot(coin: str) -> str:
         return coin + "/USD"
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def coin_to_future(coin: str, season: str) -> str:
         return coin + "-" + season
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def spot_to_coin(spot: str) -> str:
         return spot.split("/")[0]
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def spot_to_future(spot: str, season: str) -> str:
         return spot.split("/")[0] + "-" + season
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def future_to_coin(future: str) -> str:
         return future.split("-")[0]
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def future_to_spot(future: str) -> str:
         return future.split("-")[0] + "/USD"
 
@@ -156,7 +163,7 @@ class FtxHedgePair(HedgePair):
         return symbol.endswith(f"-{season}")
 
 
-@dataclass
+@dataclass(slots=True)
 class FtxLeverageInfo:
     max_leverage: Decimal = Decimal(1)
     account_value: Decimal = Decimal(0)
@@ -220,16 +227,72 @@ class FtxOrderMessage:
     avg_fill_price: Decimal
     create_timestamp: float
 
+    def __reduce__(self):
+        # sent through the pipe for every ws order, a flat tuple of str pickles several
+        # times smaller and faster than Decimal and Enum objects
+        return (
+            _unpickle_order_message,
+            (
+                self.id,
+                self.market,
+                self.type.value,
+                self.side.value,
+                _str_or_none(self.size),
+                _str_or_none(self.price),
+                self.status.value,
+                _str_or_none(self.filled_size),
+                _str_or_none(self.avg_fill_price),
+                self.create_timestamp,
+            ),
+        )
+
+
+def _str_or_none(number: Optional[Decimal]) -> Optional[str]:
+    return None if number is None else str(number)
+
+
+def _unpickle_order_message(
+    order_id: str,
+    market: str,
+    order_type: str,
+    side: str,
+    size: Optional[str],
+    price: Optional[str],
+    status: str,
+    filled_size: Optional[str],
+    avg_fill_price: Optional[str],
+    create_timestamp: float,
+) -> FtxOrderMessage:
+    return FtxOrderMessage(
+        id=order_id,
+        market=market,
+        type=FtxOrderType(order_type),
+        side=Side(side),
+        size=to_decimal_or_none(size),
+        price=to_decimal_or_none(price),
+        status=FtxOrderStatus(status),
+        filled_size=to_decimal_or_none(filled_size),
+        avg_fill_price=to_decimal_or_none(avg_fill_price),
+        create_timestamp=create_timestamp,
+    )
+
 
 @dataclass
-class FtxEntryPriceRequestMessage:
-    market: str
+class FtxBatchMessage:
+    """Several messages sent through the pipe at once"""
+
+    messages: List[object]
 
 
 @dataclass
-class FtxEntryPriceResponseMessage:
-    market: str
-    entry_price: Decimal
+class FtxEntryPriceBatchRequestMessage:
+    markets: List[str]
+
+
+@dataclass
+class FtxEntryPriceBatchResponseMessage:
+    coin: str
+    entry_prices: Dict[str, Decimal]  # market: price
 
 
 @dataclass
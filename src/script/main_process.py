@@ -2,27 +2,34 @@ import asyncio
 import logging
 import multiprocessing as mp
 import pathlib
-import re
+import random
+import string
 import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from multiprocessing.connection import Connection
-from typing import Callable, Dict, List, Tuple
+from multiprocessing.reduction import ForkingPickler
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
 
-import dateutil.parser
+import async_timeout
+from cachetools import LRUCache
 from funding_service_client.async_fs_client import FSClient
 from funding_service_client.constants import (WORKER_STATUS_FINISH,
                                               WORKER_STATUS_PROC)
 from funding_service_client.fs_exception import InsufficientBalanceError
 
-from src.common import Config, Exchange, to_decimal_or_none
+from src.common import (Config, Exchange, iso_to_timestamp, to_decimal,
+                        to_decimal_or_none)
 from src.exchange.exchange_data_type import Side, TradeType
 from src.exchange.ftx.ftx_client import FtxExchange
 from src.exchange.ftx.ftx_data_type import (Ftx_EWMA_InterestRate,
+                                            FtxBatchMessage,
                                             FtxCollateralWeight,
                                             FtxCollateralWeightMessage,
-                                            FtxEntryPriceRequestMessage,
-                                            FtxEntryPriceResponseMessage,
+                                            FtxEntryPriceBatchRequestMessage,
+                                            FtxEntryPriceBatchResponseMessage,
                                             FtxFeeRate, FtxFeeRateMessage,
                                             FtxFundOpenFilledMessage,
                                             FtxFundRequestMessage,
@@ -39,6 +46,9 @@ from src.util.fund_manager import FundManager
 from src.util.rate_limit import RateLimiter
 from src.util.slack import SlackWrappedLogger
 
+FUTURE_COIN_CHARS = frozenset(string.ascii_uppercase + string.digits)
+USD_COINS = frozenset(("USD", "USDC", "BUSD"))
+
 
 class MainProcess:
     MARKET_STATUS_POLLING_INTERVAL = 300
@@ -46,9 +56,10 @@ class MainProcess:
     FEE_RATE_POLLING_INTERVAL = 300
     COLLATERAL_WEIGHT_POLLING_INTERVAL = 300
     ACCOUNT_INFO_POLLING_INTERVAL = 5
-    RELEASE_DEAD_SUB_PROCESS_INTERVAL = 300
     LOG_SUMMARY_INTERVAL = 3600
     FUNDING_SERVICE_INTERVAL = 600
+    ENTRY_PRICE_CACHE_TTL = 7200  # sub processes push entry prices at least hourly
+    ENTRY_PRICE_CACHE_SIZE = 512
 
     def __init__(self, config: Config):
         self.config: Config = config
@@ -58,6 +69,9 @@ class MainProcess:
                 config.api_key, config.api_secret, config.subaccount_name,
             )
             self.trading_rules: Dict[str, FtxTradingRule] = {}
+            self._future_position_index: Dict[
+                str, Tuple[str, Decimal]
+            ] = {}  # future: (coin, min order size of the pair)
             self.hedge_pairs: Dict[str, FtxHedgePair] = {}
             self.ewma_interest_rate = Ftx_EWMA_InterestRate(
                 lookback_days=config.interest_rate_lookback_days,
@@ -68,10 +82,13 @@ class MainProcess:
             self.leverage_info = FtxLeverageInfo()
 
             # log summary
-            self._entry_prices: Dict[str, Decimal] = {}  # market: price
-            self._receive_entry_price_events: Dict[
-                str, asyncio.Event
-            ] = {}  # market: Event
+            # bounded, markets of dropped coins and past seasons are not kept forever
+            self._entry_price_cache: LRUCache[str, Tuple[Decimal, float]] = LRUCache(
+                maxsize=self.ENTRY_PRICE_CACHE_SIZE
+            )  # market: (price, timestamp)
+            self._receive_entry_price_events: LRUCache[str, asyncio.Event] = LRUCache(
+                maxsize=self.ENTRY_PRICE_CACHE_SIZE
+            )  # coin: Event
 
             # params initializer, to notify sub process all params are ready
             self._trading_rules_ready_event = asyncio.Event()
@@ -85,7 +102,19 @@ class MainProcess:
             self._loop = asyncio.get_event_loop()
             self._connections: Dict[str, Tuple[Connection, Connection]] = {}
             self._sub_processes: Dict[str, mp.Process] = {}
-            self._sub_process_notify_events: Dict[str, asyncio.Event] = {}
+            self._sub_process_msg_tasks: Set[asyncio.Task] = set()
+            # market: coin of ws orders, None for other markets
+            self._market_coins: Dict[str, Optional[str]] = {}
+            self._sub_process_msg_handlers: Dict[
+                type, Callable[[Connection, object], None]
+            ] = {
+                FtxFundRequestMessage: self._handle_fund_request,
+                FtxFundOpenFilledMessage: self._handle_fund_open_filled,
+                FtxEntryPriceBatchResponseMessage: self._handle_entry_price_response,
+            }
+            # one worker per pipe keeps its message order, and a stuck pipe only
+            # delays its own sub process
+            self._pipe_send_executors: Dict[Connection, ThreadPoolExecutor] = {}
 
             # tasks
             self._market_status_polling_task: asyncio.Task = None
@@ -93,11 +122,9 @@ class MainProcess:
             self._fee_rate_polling_task: asyncio.Task = None
             self._collateral_weight_polling_task: asyncio.Task = None
             self._spawn_sub_processes_task: asyncio.Task = None
-            self._sub_process_listen_tasks: Dict[str, asyncio.Task] = {}
             self._start_ws_task: asyncio.Task = None
             self._listen_ws_orders_task: asyncio.Task = None
             self._account_info_polling_task: asyncio.Task = None
-            self._release_dead_sub_process_loop_task: asyncio.Task = None
             self._log_summary_polling_task: asyncio.Task = None
             self._apply_funding_service_task: asyncio.Task = None
 
@@ -108,15 +135,15 @@ class MainProcess:
             self.fund_manager = FundManager(leverage_limit=config.leverage_limit)
 
             # rate limit
-            self.rate_limiter_manager = mp.Manager()
             interval = config.rate_limit_config.interval
             limit = config.rate_limit_config.limit
-            self.rate_limiter = RateLimiter(self.rate_limiter_manager, interval, limit)
+            self.rate_limiter = RateLimiter(interval, limit)
 
             # funding service
             self._fs_client: FSClient = None
-            self._deposit_history_cache: List[dict] = []
-            self._withdraw_history_cache: List[dict] = []
+            # sorted by time, oldest first
+            self._deposit_history_cache: Deque[dict] = deque()
+            self._withdraw_history_cache: Deque[dict] = deque()
 
     def _init_get_logger(self):
         log = self.config.log
@@ -157,16 +184,24 @@ class MainProcess:
     @property
     def status_dict(self) -> Dict[str, bool]:
         return {
-            "trading_rule_initialized": len(self.trading_rules) > 0,
+            "trading_rule_initialized": self._trading_rules_ready_event.is_set(),
             "hedge_pair_initialized": len(self.hedge_pairs) > 0,
-            "interest_rate_initialized": self.interest_rate is not None,
-            "taker_fee_rate_initialized": self.fee_rate.taker_fee_rate is not None,
-            "collateral_weight_initialized": len(self.collateral_weights) > 0,
+            "interest_rate_initialized": self._interest_rate_ready_event.is_set(),
+            "taker_fee_rate_initialized": self._fee_rate_ready_event.is_set(),
+            "collateral_weight_initialized": (
+                self._collateral_weights_ready_event.is_set()
+            ),
         }
 
     @property
     def ready(self) -> bool:
-        return all(self.status_dict.values())
+        return (
+            self._trading_rules_ready_event.is_set()
+            and len(self.hedge_pairs) > 0
+            and self._interest_rate_ready_event.is_set()
+            and self._fee_rate_ready_event.is_set()
+            and self._collateral_weights_ready_event.is_set()
+        )
 
     def start_network(self):
         if self._market_status_polling_task is None:
@@ -197,10 +232,6 @@ class MainProcess:
             )
         if self._listen_ws_orders_task is None:
             self._listen_ws_orders_task = asyncio.create_task(self._listen_ws_orders())
-        if self._release_dead_sub_process_loop_task is None:
-            self._release_dead_sub_process_loop_task = asyncio.create_task(
-                self._release_dead_sub_process_loop()
-            )
         if self._log_summary_polling_task is None:
             self._log_summary_polling_task = asyncio.create_task(
                 self._log_summary_polling_loop()
@@ -238,29 +269,26 @@ class MainProcess:
         if self._listen_ws_orders_task is not None:
             self._listen_ws_orders_task.cancel()
             self._listen_ws_orders_task = None
-        if self._release_dead_sub_process_loop_task is not None:
-            self._release_dead_sub_process_loop_task.cancel()
-            self._release_dead_sub_process_loop_task = None
         if self._log_summary_polling_task is not None:
             self._log_summary_polling_task.cancel()
             self._log_summary_polling_task = None
         if self._apply_funding_service_task is not None:
             self._apply_funding_service_task.cancel()
             self._apply_funding_service_task = None
-        self._stop_all_sub_process_listen_tasks()
+        self._stop_all_sub_process_msg_tasks()
         self._stop_all_sub_processes()
 
-    async def _market_status_polling_loop(self):
-        """Handle the market infomations. Combined the bollowing tasks to make only one request.
-        1. update TradingRule
-        2. uddate HedgePair
-        """
+    async def _polling_loop(
+        self,
+        poll: Callable[[], Awaitable[None]],
+        interval: float,
+        error_msg: str,
+        error_sleep: float = 5,
+    ):
         while True:
             try:
-                markets = await self.exchange.get_markets()
-                self._update_trading_rule(markets)
-                await self._update_hedge_pair(markets)
-                await asyncio.sleep(self.MARKET_STATUS_POLLING_INTERVAL)
+                await poll()
+                await asyncio.sleep(interval)
             except asyncio.CancelledError:
                 raise
             except BlockingIOError:
@@ -270,38 +298,99 @@ class MainProcess:
                 sys.exit(1)
             except Exception:
                 self.logger.error(
-                    "Unexpected error while fetching market status.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
+                    error_msg, exc_info=True, slack=self.config.slack_config.enable,
                 )
-                await asyncio.sleep(10)
+                await asyncio.sleep(error_sleep)
+
+    async def _market_status_polling_loop(self):
+        """Handle the market infomations. Combined the bollowing tasks to make only one request.
+        1. update TradingRule
+        2. uddate HedgePair
+        """
+        await self._polling_loop(
+            self._poll_market_status,
+            self.MARKET_STATUS_POLLING_INTERVAL,
+            "Unexpected error while fetching market status.",
+            error_sleep=10,
+        )
+
+    async def _poll_market_status(self):
+        markets = await self.exchange.get_markets()
+        self._update_trading_rule(markets)
+        await self._update_hedge_pair(markets)
 
     def _update_trading_rule(self, market_infos: List[dict]):
         trading_rules = {}
         for market in market_infos:
             symbol = market["name"]
-            min_order_size = Decimal(str(market["sizeIncrement"]))
-            price_tick = Decimal(str(market["priceIncrement"]))
+            min_order_size = to_decimal(market["sizeIncrement"])
+            price_tick = to_decimal(market["priceIncrement"])
             trading_rules[symbol] = FtxTradingRule(symbol, min_order_size, price_tick)
+        # only changed trading rules are sent to sub processes
+        changed_symbols = {
+            symbol
+            for symbol, trading_rule in trading_rules.items()
+            if self.trading_rules.get(symbol) != trading_rule
+        }
         self.trading_rules.update(trading_rules)
+        self._update_future_position_index()
         self._trading_rules_ready_event.set()
+        if len(changed_symbols) == 0:
+            return
         for coin, (conn, _) in self._connections.items():
-            spot = FtxHedgePair.coin_to_spot(coin)
-            future = FtxHedgePair.coin_to_future(coin, self.config.season)
-            if self.trading_rules.get(spot):
-                conn.send(FtxTradingRuleMessage(self.trading_rules[spot]))
-            if self.trading_rules.get(future):
-                conn.send(FtxTradingRuleMessage(self.trading_rules[future]))
+            hedge_pair = self.hedge_pairs.get(coin)
+            if hedge_pair is not None:
+                spot, future = hedge_pair.spot, hedge_pair.future
+            else:
+                # the sub process is still alive after its coin is dropped
+                spot = FtxHedgePair.coin_to_spot(coin)
+                future = FtxHedgePair.coin_to_future(coin, self.config.season)
+            messages = []
+            if spot in changed_symbols:
+                messages.append(FtxTradingRuleMessage(self.trading_rules[spot]))
+            if future in changed_symbols:
+                messages.append(FtxTradingRuleMessage(self.trading_rules[future]))
+            if len(messages) > 0:
+                self._send_to_sub_process(conn, FtxBatchMessage(messages))
+
+    def _update_future_position_index(self):
+        """Map every future that has a spot market to its coin and the min order
+        size of the pair, used to check whether a position is big enough"""
+        future_position_index: Dict[str, Tuple[str, Decimal]] = {}
+        for symbol, trading_rule in self.trading_rules.items():
+            if FtxHedgePair.is_spot(symbol):
+                continue
+            spot_trading_rule = self.trading_rules.get(
+                FtxHedgePair.future_to_spot(symbol)
+            )
+            if spot_trading_rule is None:
+                continue
+            future_position_index[symbol] = (
+                FtxHedgePair.future_to_coin(symbol),
+                max(spot_trading_rule.min_order_size, trading_rule.min_order_size),
+            )
+        self._future_position_index = future_position_index
 
     async def _update_hedge_pair(self, market_infos: List[dict]):
-        symbol_set = set([info["name"] for info in market_infos if info["enabled"]])
-        regex = re.compile(f"[0-9A-Z]+-{self.config.season}")
+        suffix = f"-{self.config.season}"
+        suffix_len = len(suffix)
+        symbol_set: Set[str] = set()
+        future_candidates: List[str] = []
+        market_volume_map: Dict[str, float] = {}
+        for info in market_infos:
+            symbol = info["name"]
+            market_volume_map[symbol] = info["volumeUsd24h"]
+            if not info["enabled"]:
+                continue
+            symbol_set.add(symbol)
+            # same as matching "[0-9A-Z]+-{season}"
+            if symbol.endswith(suffix):
+                prefix = symbol[:-suffix_len]
+                if prefix and FUTURE_COIN_CHARS.issuperset(prefix):
+                    future_candidates.append(symbol)
         hedge_pairs: Dict[str, FtxHedgePair] = {}
-        for symbol in symbol_set:
-            if (
-                regex.match(symbol)
-                and FtxHedgePair.future_to_spot(symbol) in symbol_set
-            ):
+        for symbol in future_candidates:
+            if FtxHedgePair.future_to_spot(symbol) in symbol_set:
                 coin = FtxHedgePair.future_to_coin(symbol)
                 hedge_pairs[coin] = FtxHedgePair.from_future(symbol)
 
@@ -309,33 +398,27 @@ class MainProcess:
         coins_that_have_position = await self._get_coins_that_have_position(symbol_set)
 
         # hedge pairs that have low daily trading volume (illiquid pair) should be added to blacklist
-        market_volume_map: Dict[str, float] = {
-            info["name"]: info["volumeUsd24h"] for info in market_infos
-        }
-        low_volume_coins: List[str] = []
+        low_volume_coins: Set[str] = set()
+        min_volume_usd_24h = self.config.min_volume_usd_24h
         for coin, pair in hedge_pairs.items():
-            if (
-                market_volume_map.get(pair.spot) is not None
-                and market_volume_map[pair.spot] < self.config.min_volume_usd_24h
-            ):
-                low_volume_coins.append(coin)
+            spot_volume = market_volume_map.get(pair.spot)
+            if spot_volume is not None and spot_volume < min_volume_usd_24h:
+                low_volume_coins.add(coin)
                 continue
-            if (
-                market_volume_map.get(pair.future) is not None
-                and market_volume_map[pair.future] < self.config.min_volume_usd_24h
-            ):
-                low_volume_coins.append(coin)
+            future_volume = market_volume_map.get(pair.future)
+            if future_volume is not None and future_volume < min_volume_usd_24h:
+                low_volume_coins.add(coin)
                 continue
 
         # blacklist coins with low collateral weight
         await self._collateral_weights_ready_event.wait()
-        low_weight_coins: List[str] = []
+        low_weight_coins: Set[str] = set()
         for coin, pair in hedge_pairs.items():
             if (
                 self.collateral_weights.get(coin) is None
                 or self.collateral_weights[coin].weight < 0.1
             ):
-                low_weight_coins.append(coin)
+                low_weight_coins.add(coin)
 
         # handle whitelist
         if len(self.config.whitelist) == 0:
@@ -355,9 +438,10 @@ class MainProcess:
                     )
 
         # handle blacklist
-        for coin in (
-            set(self.config.blacklist).union(low_volume_coins).union(low_weight_coins)
-        ):
+        blacklist_coins = set().union(
+            self.config.blacklist, low_volume_coins, low_weight_coins
+        )
+        for coin in blacklist_coins:
             if self.hedge_pairs.get(coin):
                 if coin in coins_that_have_position:
                     self.hedge_pairs[coin].trade_type = TradeType.CLOSE_ONLY
@@ -371,187 +455,152 @@ class MainProcess:
         await self._trading_rules_ready_event.wait()
         balances = await self.exchange.get_balances()
         balance_map = {
-            b["coin"]: Decimal(str(b["total"]))
+            b["coin"]: to_decimal(b["total"])
             for b in balances
             if FtxHedgePair.coin_to_spot(b["coin"]) in symbol_set
         }
         positions = await self.exchange.get_positions()
         coins = []
         for position in positions:
-            future = position["future"]
-            coin = FtxHedgePair.future_to_coin(future)
-            spot = FtxHedgePair.future_to_spot(future)
-            future_new_size = Decimal(str(position["netSize"]))
-            if self.trading_rules.get(spot) and self.trading_rules.get(future):
-                min_order_size = max(
-                    self.trading_rules[spot].min_order_size,
-                    self.trading_rules[future].min_order_size,
-                )
-                if future_new_size > -min_order_size:
-                    continue
-                if balance_map.get(coin, Decimal(0)) >= min_order_size:
-                    coins.append(coin)
+            index = self._future_position_index.get(position["future"])
+            if index is None:
+                continue
+            coin, min_order_size = index
+            if to_decimal(position["netSize"]) > -min_order_size:
+                continue
+            if balance_map.get(coin, Decimal(0)) >= min_order_size:
+                coins.append(coin)
         return coins
 
     async def _interest_rate_polling_loop(self):
-        while True:
-            try:
-                et = time.time()
-                ewma = self.ewma_interest_rate.last_ewma
-                if ewma is None:
-                    st = et - self.ewma_interest_rate.lookback_days * 24 * 3600
-                else:
-                    st = self.ewma_interest_rate.last_timestamp + 1
-                rate_info = await self.exchange.get_full_spot_margin_history(st, et)
-                if len(rate_info) == 0:
-                    await asyncio.sleep(self.INTEREST_RATE_POLLING_INTERVAL)
-                    continue
-                for info in rate_info:
-                    rate = Decimal(str(info["rate"]))
-                    ewma = (
-                        self.ewma_interest_rate.lambda_ * rate
-                        + (1 - self.ewma_interest_rate.lambda_) * ewma
-                        if ewma
-                        else rate
-                    )
-                self.ewma_interest_rate.last_ewma = ewma
-                self.ewma_interest_rate.last_timestamp = dateutil.parser.parse(
-                    rate_info[-1]["time"]
-                ).timestamp()
-                self._interest_rate_ready_event.set()
-                for (conn, _) in self._connections.values():
-                    conn.send(FtxInterestRateMessage(self.ewma_interest_rate))
-                await asyncio.sleep(self.INTEREST_RATE_POLLING_INTERVAL)
-            except asyncio.CancelledError:
-                raise
-            except BlockingIOError:
-                self.logger.error(
-                    "System exit", exc_info=True, slack=self.config.slack_config.enable,
-                )
-                sys.exit(1)
-            except Exception:
-                self.logger.error(
-                    "Unexpected error while fetching USD interest rate.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
-                )
-                await asyncio.sleep(5)
+        await self._polling_loop(
+            self._poll_interest_rate,
+            self.INTEREST_RATE_POLLING_INTERVAL,
+            "Unexpected error while fetching USD interest rate.",
+        )
+
+    async def _poll_interest_rate(self):
+        et = time.time()
+        ewma = self.ewma_interest_rate.last_ewma
+        if ewma is None:
+            st = et - self.ewma_interest_rate.lookback_days * 24 * 3600
+        else:
+            st = self.ewma_interest_rate.last_timestamp + 1
+        rate_info = await self.exchange.get_full_spot_margin_history(st, et)
+        if len(rate_info) == 0:
+            return
+        lambda_ = self.ewma_interest_rate.lambda_
+        decay = 1 - lambda_
+        for info in rate_info:
+            rate = Decimal(str(info["rate"]))
+            ewma = lambda_ * rate + decay * ewma if ewma else rate
+        self.ewma_interest_rate.last_ewma = ewma
+        self.ewma_interest_rate.last_timestamp = iso_to_timestamp(rate_info[-1]["time"])
+        self._interest_rate_ready_event.set()
+        self._send_to_all_sub_processes(FtxInterestRateMessage(self.ewma_interest_rate))
 
     async def _fee_rate_polling_loop(self):
-        while True:
-            try:
-                account = await self.exchange.get_account()
-                self.fee_rate.maker_fee_rate = Decimal(str(account["makerFee"]))
-                self.fee_rate.taker_fee_rate = Decimal(str(account["takerFee"]))
-                self.ewma_interest_rate.set_taker_fee_rate(self.fee_rate.taker_fee_rate)
-                self._fee_rate_ready_event.set()
-                for (conn, _) in self._connections.values():
-                    conn.send(FtxFeeRateMessage(self.fee_rate))
-                await asyncio.sleep(self.FEE_RATE_POLLING_INTERVAL)
-            except asyncio.CancelledError:
-                raise
-            except BlockingIOError:
-                self.logger.error(
-                    "System exit", exc_info=True, slack=self.config.slack_config.enable,
-                )
-                sys.exit(1)
-            except Exception:
-                self.logger.error(
-                    "Unexpected error while fetching account fee rate.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
-                )
-                await asyncio.sleep(5)
+        await self._polling_loop(
+            self._poll_fee_rate,
+            self.FEE_RATE_POLLING_INTERVAL,
+            "Unexpected error while fetching account fee rate.",
+        )
+
+    async def _poll_fee_rate(self):
+        account = await self.exchange.get_account()
+        maker_fee_rate = to_decimal(account["makerFee"])
+        taker_fee_rate = to_decimal(account["takerFee"])
+        is_changed = (
+            self.fee_rate.maker_fee_rate != maker_fee_rate
+            or self.fee_rate.taker_fee_rate != taker_fee_rate
+        )
+        self.fee_rate.maker_fee_rate = maker_fee_rate
+        self.fee_rate.taker_fee_rate = taker_fee_rate
+        self.ewma_interest_rate.set_taker_fee_rate(self.fee_rate.taker_fee_rate)
+        self._fee_rate_ready_event.set()
+        if is_changed:
+            self._send_to_all_sub_processes(FtxFeeRateMessage(self.fee_rate))
 
     async def _collateral_weight_polling_loop(self):
-        while True:
-            try:
-                coin_infos = await self.exchange.get_coins()
-                for info in coin_infos:
-                    coin = info["id"]
-                    weight = Decimal(str(info["collateralWeight"]))
-                    self.collateral_weights[coin] = FtxCollateralWeight(
-                        coin=coin, weight=weight
-                    )
-                    if self._connections.get(coin):
-                        self._connections[coin][0].send(
-                            FtxCollateralWeightMessage(self.collateral_weights[coin])
-                        )
-                self._collateral_weights_ready_event.set()
-                await asyncio.sleep(self.COLLATERAL_WEIGHT_POLLING_INTERVAL)
-            except asyncio.CancelledError:
-                raise
-            except BlockingIOError:
-                self.logger.error(
-                    "System exit", exc_info=True, slack=self.config.slack_config.enable,
-                )
-                sys.exit(1)
-            except Exception:
-                self.logger.error(
-                    "Unexpected error while fetching coin collateral weights.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
+        await self._polling_loop(
+            self._poll_collateral_weights,
+            self.COLLATERAL_WEIGHT_POLLING_INTERVAL,
+            "Unexpected error while fetching coin collateral weights.",
+        )
+
+    async def _poll_collateral_weights(self):
+        coin_infos = await self.exchange.get_coins()
+        for info in coin_infos:
+            coin = info["id"]
+            weight = to_decimal(info["collateralWeight"])
+            collateral_weight = self.collateral_weights.get(coin)
+            if collateral_weight is not None and collateral_weight.weight == weight:
+                continue
+            self.collateral_weights[coin] = FtxCollateralWeight(
+                coin=coin, weight=weight
+            )
+            if self._connections.get(coin):
+                self._send_to_sub_process(
+                    self._connections[coin][0],
+                    FtxCollateralWeightMessage(self.collateral_weights[coin]),
                 )
-                await asyncio.sleep(5)
+        self._collateral_weights_ready_event.set()
 
     def _update_account_info(self, account_info: dict):
-        account_value = Decimal(str(account_info["totalAccountValue"]))
-        position_value = Decimal(str(account_info["totalPositionSize"]))
+        account_value = to_decimal(account_info["totalAccountValue"])
+        position_value = to_decimal(account_info["totalPositionSize"])
         current_leverage = position_value / account_value
-        self.leverage_info = FtxLeverageInfo(
-            max_leverage=Decimal(str(account_info["leverage"])),
+        leverage_info = FtxLeverageInfo(
+            max_leverage=to_decimal(account_info["leverage"]),
             account_value=account_value,
             position_value=position_value,
             current_leverage=current_leverage,
         )
+        is_changed = leverage_info != self.leverage_info
+        self.leverage_info = leverage_info
         self._account_info_ready_event.set()
-        for (conn, _) in self._connections.values():
-            conn.send(FtxLeverageMessage(self.leverage_info))
+        if is_changed:
+            self._send_to_all_sub_processes(FtxLeverageMessage(self.leverage_info))
 
     async def _account_info_polling_loop(self):
-        while True:
-            try:
-                account_info = await self.exchange.get_account()
-                self._update_account_info(account_info)
-                await self.fund_manager.update_account_state(account_info)
-                await asyncio.sleep(self.ACCOUNT_INFO_POLLING_INTERVAL)
-            except asyncio.CancelledError:
-                raise
-            except BlockingIOError:
-                self.logger.error(
-                    "System exit", exc_info=True, slack=self.config.slack_config.enable,
-                )
-                sys.exit(1)
-            except Exception:
-                self.logger.error(
-                    "Unexpected error while fetching account info.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
-                )
-                await asyncio.sleep(5)
+        await self._polling_loop(
+            self._poll_account_info,
+            self.ACCOUNT_INFO_POLLING_INTERVAL,
+            "Unexpected error while fetching account info.",
+        )
+
+    async def _poll_account_info(self):
+        account_info = await self.exchange.get_account()
+        self._update_account_info(account_info)
+        await self.fund_manager.update_account_state(account_info)
+
+    async def _wait_ready(self, event: asyncio.Event, name: str):
+        await event.wait()
+        self.logger.debug(f"{name} ready!")
 
     async def _spawn_sub_processes(self):
         while True:
             try:
                 async with self._hedge_pair_initialized_cond:
                     await self._hedge_pair_initialized_cond.wait()
-                await self._trading_rules_ready_event.wait()
-                self.logger.debug("trading rules ready!")
-                await self._interest_rate_ready_event.wait()
-                self.logger.debug("interest rate ready!")
-                await self._fee_rate_ready_event.wait()
-                self.logger.debug("fee rate ready!")
-                await self._collateral_weights_ready_event.wait()
-                self.logger.debug("collateral weights ready!")
-                await self._account_info_ready_event.wait()
-                self.logger.debug("account info ready!")
+                await asyncio.gather(
+                    self._wait_ready(self._trading_rules_ready_event, "trading rules"),
+                    self._wait_ready(self._interest_rate_ready_event, "interest rate"),
+                    self._wait_ready(self._fee_rate_ready_event, "fee rate"),
+                    self._wait_ready(
+                        self._collateral_weights_ready_event, "collateral weights"
+                    ),
+                    self._wait_ready(self._account_info_ready_event, "account info"),
+                )
 
                 for coin, hedge_pair in self.hedge_pairs.items():
                     if self._sub_processes.get(coin) is None:
                         # build pipe connection
                         conn1, conn2 = mp.Pipe(duplex=True)
                         self._connections[hedge_pair.coin] = (conn1, conn2)
-                        self._sub_process_notify_events[coin] = asyncio.Event()
+                        self._pipe_send_executors[conn1] = ThreadPoolExecutor(
+                            max_workers=1, thread_name_prefix=f"pipe_send_{coin}"
+                        )
                         # spawn sub process
                         sub_process = mp.Process(
                             target=run_sub_process,
@@ -560,37 +609,43 @@ class MainProcess:
                         )
                         sub_process.start()
                         self._sub_processes[coin] = sub_process
-                        # create sub process listening task
-                        self._sub_process_listen_tasks[coin] = asyncio.create_task(
-                            self._listen_sub_process_msg(coin)
+                        # release the sub process once it is dead
+                        self._loop.add_reader(
+                            sub_process.sentinel, self._on_sub_process_exit, coin
+                        )
+                        # listen to sub process messages
+                        self._loop.add_reader(
+                            conn1.fileno(), self._on_sub_process_msg_ready, coin
                         )
 
                         # notify params
+                        messages = []
                         if self.trading_rules.get(hedge_pair.spot):
-                            conn1.send(
+                            messages.append(
                                 FtxTradingRuleMessage(
                                     self.trading_rules[hedge_pair.spot]
                                 )
                             )
                         if self.trading_rules.get(hedge_pair.future):
-                            conn1.send(
+                            messages.append(
                                 FtxTradingRuleMessage(
                                     self.trading_rules[hedge_pair.future]
                                 )
                             )
-                        conn1.send(
+                        messages.append(
                             FtxInterestRateMessage(
                                 ewma_interest_rate=self.ewma_interest_rate
                             )
                         )
-                        conn1.send(FtxFeeRateMessage(fee_rate=self.fee_rate))
+                        messages.append(FtxFeeRateMessage(fee_rate=self.fee_rate))
                         if self.collateral_weights.get(coin):
-                            conn1.send(
+                            messages.append(
                                 FtxCollateralWeightMessage(
                                     collateral_weight=self.collateral_weights[coin]
                                 )
                             )
-                        conn1.send(FtxLeverageMessage(leverage=self.leverage_info))
+                        messages.append(FtxLeverageMessage(leverage=self.leverage_info))
+                        self._send_to_sub_process(conn1, FtxBatchMessage(messages))
 
             except asyncio.CancelledError:
                 raise
@@ -606,114 +661,196 @@ class MainProcess:
                     slack=self.config.slack_config.enable,
                 )
 
-    async def _release_dead_sub_process_loop(self):
-        while True:
-            try:
-                for coin, process in list(self._sub_processes.items()):
-                    if not process.is_alive():
-                        # release process resource
-                        process.join()
-                        process.close()
-                        del self._sub_processes[coin]
-                        # release PIPE connection resource
-                        self._connections[coin][0].close()
-                        self._connections[coin][1].close()
-                        del self._connections[coin]
-                        self.logger.info(f"Close {coin} sub process")
-                await asyncio.sleep(self.RELEASE_DEAD_SUB_PROCESS_INTERVAL)
-            except asyncio.CancelledError:
-                raise
-            except Exception:
-                self.logger.error(
-                    "Unexpected error while release dead sub process.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
-                )
+    def _on_sub_process_exit(self, coin: str):
+        """Reader callback of the sub process sentinel, release the dead sub process"""
+        try:
+            process = self._sub_processes.pop(coin)
+            # release process resource
+            self._loop.remove_reader(process.sentinel)
+            process.join()
+            process.close()
+            # handle the messages sent right before exit, before the release
+            self._on_sub_process_msg_ready(coin)
+            # release PIPE connection resource
+            self._close_connections(*self._connections.pop(coin))
+            # release collateral frozen for the sub process
+            self._create_sub_process_msg_task(self.fund_manager.release_freeze(coin))
+            self.logger.info(f"Close {coin} sub process")
+        except Exception:
+            self.logger.error(
+                "Unexpected error while release dead sub process.",
+                exc_info=True,
+                slack=self.config.slack_config.enable,
+            )
 
     def _stop_all_sub_processes(self):
-        for coin, process in self._sub_processes.items():
+        for coin, process in list(self._sub_processes.items()):
             # release process resource
+            self._loop.remove_reader(process.sentinel)
             process.terminate()
             process.join()
             process.close()
             del self._sub_processes[coin]
             # release PIPE connection resource
-            self._connections[coin][0].close()
-            self._connections[coin][1].close()
-            del self._connections[coin]
+            self._close_connections(*self._connections.pop(coin))
             self.logger.info(f"Close {coin} sub process")
 
-    async def _listen_sub_process_msg(self, coin: str):
+    def _close_connections(self, conn1: Connection, conn2: Connection):
+        """conn1 is closed in its send worker after the sends already queued on it,
+        the worker exits once the close is done. A send may stay blocked while
+        sibling sub processes still hold forked copies of the pipe, it only delays
+        this pipe"""
+        self._loop.remove_reader(conn1.fileno())
+        conn2.close()
+        executor = self._pipe_send_executors.pop(conn1)
+        executor.submit(conn1.close)
+        executor.shutdown(wait=False)
+
+    def _on_sub_process_msg_ready(self, coin: str):
+        """Reader callback of the sub process pipe, drain all the ready messages"""
         conn = self._connections[coin][0]
-        self._loop.add_reader(conn.fileno(), self._sub_process_notify_events[coin].set)
-        while True:
-            try:
-                if not conn.poll():
-                    await self._sub_process_notify_events[coin].wait()
+        try:
+            while conn.poll():
                 msg = conn.recv()
                 self.logger.debug(f"Get msg from {coin} child process: {msg}")
-                if type(msg) is FtxFundRequestMessage:
-                    response = await self.fund_manager.request_for_budget(msg)
-                    conn.send(response)
-                elif type(msg) is FtxFundOpenFilledMessage:
-                    await self.fund_manager.handle_open_order_filled(msg)
-                elif type(msg) is FtxEntryPriceResponseMessage:
-                    market = msg.market
-                    if self._receive_entry_price_events.get(market) is None:
-                        self._receive_entry_price_events[market] = asyncio.Event()
-                    self._entry_prices[market] = msg.entry_price
-                    self._receive_entry_price_events[market].set()
-                self._sub_process_notify_events[coin].clear()
-            except asyncio.CancelledError:
-                raise
-            except Exception:
-                self.logger.error(
-                    "Unexpected error while listen to sub process message.",
-                    exc_info=True,
-                    slack=self.config.slack_config.enable,
-                )
-                await asyncio.sleep(5)
+                self._handle_sub_process_msg(conn, msg)
+        except (EOFError, OSError):
+            # sub process is dead, stop listening until its resource is released
+            self._loop.remove_reader(conn.fileno())
+        except Exception:
+            self.logger.error(
+                "Unexpected error while listen to sub process message.",
+                exc_info=True,
+                slack=self.config.slack_config.enable,
+            )
 
-    async def _stop_all_sub_process_listen_tasks(self):
-        for task in self._sub_process_listen_tasks.values():
+    def _handle_sub_process_msg(self, conn: Connection, msg):
+        handler = self._sub_process_msg_handlers.get(type(msg))
+        if handler is not None:
+            handler(conn, msg)
+
+    def _handle_fund_request(self, conn: Connection, msg: FtxFundRequestMessage):
+        self._create_sub_process_msg_task(self._reply_fund_request(conn, msg))
+
+    def _handle_fund_open_filled(self, conn: Connection, msg: FtxFundOpenFilledMessage):
+        self._create_sub_process_msg_task(
+            self.fund_manager.handle_open_order_filled(msg)
+        )
+
+    def _handle_entry_price_response(
+        self, conn: Connection, msg: FtxEntryPriceBatchResponseMessage
+    ):
+        now = time.time()
+        for market, entry_price in msg.entry_prices.items():
+            self._entry_price_cache[market] = (entry_price, now)
+        if self._receive_entry_price_events.get(msg.coin) is None:
+            self._receive_entry_price_events[msg.coin] = asyncio.Event()
+        self._receive_entry_price_events[msg.coin].set()
+
+    def _create_sub_process_msg_task(self, coro):
+        # keep a reference to the task until it is done
+        task = asyncio.create_task(coro)
+        self._sub_process_msg_tasks.add(task)
+        task.add_done_callback(self._on_sub_process_msg_task_done)
+
+    def _on_sub_process_msg_task_done(self, task: asyncio.Task):
+        self._sub_process_msg_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(
+                "Unexpected error while handle sub process message.",
+                exc_info=task.exception(),
+                slack=self.config.slack_config.enable,
+            )
+
+    async def _reply_fund_request(self, conn: Connection, msg: FtxFundRequestMessage):
+        response = await self.fund_manager.request_for_budget(msg)
+        self._send_to_sub_process(conn, response)
+
+    def _send_to_sub_process(self, conn: Connection, msg):
+        self._send_bytes_to_sub_process(conn, ForkingPickler.dumps(msg))
+
+    def _send_to_all_sub_processes(self, msg):
+        """Pickle once, every sub process receives the same bytes"""
+        data = ForkingPickler.dumps(msg)
+        for (conn, _) in self._connections.values():
+            self._send_bytes_to_sub_process(conn, data)
+
+    def _send_bytes_to_sub_process(self, conn: Connection, data: bytes):
+        """Send in the worker thread, a busy sub process could fill up the pipe and
+        block the event loop. Same as conn.send for the receiver, conn.recv unpickles
+        the bytes"""
+        executor = self._pipe_send_executors.get(conn)
+        if executor is None:
+            # the sub process is dead and its pipe is released
+            self.logger.debug("Drop msg to closed sub process pipe.")
+            return
+        future = self._loop.run_in_executor(executor, conn.send_bytes, data)
+        future.add_done_callback(self._on_send_to_sub_process_done)
+
+    def _on_send_to_sub_process_done(self, future: asyncio.Future):
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is None:
+            return
+        if isinstance(exception, OSError):
+            # the sub process is dead and its pipe is released
+            self.logger.debug(f"Drop msg to closed sub process pipe. {exception}")
+            return
+        self.logger.error(
+            "Unexpected error while send msg to sub process.",
+            exc_info=exception,
+            slack=self.config.slack_config.enable,
+        )
+
+    def _stop_all_sub_process_msg_tasks(self):
+        for task in self._sub_process_msg_tasks:
             task.cancel()
 
+    def _market_to_coin(self, market: str) -> Optional[str]:
+        """Coin of a spot or season future market, None for other markets"""
+        if market in self._market_coins:
+            return self._market_coins[market]
+        if FtxHedgePair.is_spot(market):
+            coin = FtxHedgePair.spot_to_coin(market)
+        elif FtxHedgePair.is_future(market, self.config.season):
+            coin = FtxHedgePair.future_to_coin(market)
+        else:
+            coin = None
+        self._market_coins[market] = coin
+        return coin
+
     async def _listen_ws_orders(self):
         while True:
             try:
-                data = await self.exchange.orders.get()
-                order_msg = FtxOrderMessage(
-                    id=str(data["id"]),
-                    market=data["market"],
-                    type=FtxOrderType.LIMIT
-                    if data["type"] == "limit"
-                    else FtxOrderType.MARKET,
-                    side=Side.BUY if data["side"] == "buy" else Side.SELL,
-                    size=Decimal(str(data["size"])),
-                    price=Decimal(str(data["price"]))
-                    if isinstance(data["price"], (float, int))
-                    else data["price"],
-                    status=FtxOrderStatus.str_entry(data["status"]),
-                    filled_size=Decimal(str(data["filledSize"])),
-                    avg_fill_price=Decimal(str(data["avgFillPrice"]))
-                    if data["avgFillPrice"]
-                    else None,
-                    create_timestamp=dateutil.parser.parse(
-                        data["createdAt"]
-                    ).timestamp(),
-                )
-                if FtxHedgePair.is_spot(order_msg.market):
-                    coin = FtxHedgePair.spot_to_coin(order_msg.market)
-                    if self._connections.get(coin):
-                        conn = self._connections[coin][0]
-                        conn.send(order_msg)
-                elif FtxHedgePair.is_future(order_msg.market, self.config.season):
-                    coin = FtxHedgePair.future_to_coin(order_msg.market)
-                    if self._connections.get(coin):
-                        conn = self._connections[coin][0]
-                        conn.send(order_msg)
-                else:
-                    self.logger.warning(f"Get unknown order msg: {order_msg}")
+                datas = [await self.exchange.orders.get()]
+                # drain the orders already queued, one pipe message per coin
+                while not self.exchange.orders.empty():
+                    datas.append(self.exchange.orders.get_nowait())
+                coin_order_msgs: Dict[str, List[FtxOrderMessage]] = {}
+                for data in datas:
+                    try:
+                        coin = self._market_to_coin(data["market"])
+                        if coin is None:
+                            self.logger.warning(f"Get unknown order msg: {data}")
+                        elif self._connections.get(coin):
+                            # only parse orders that a sub process will consume
+                            coin_order_msgs.setdefault(coin, []).append(
+                                self._parse_ws_order(data)
+                            )
+                    except Exception:
+                        # a bad order only drops itself, not the rest of the batch
+                        self.logger.error(
+                            f"Unexpected error while parse ws order: {data}",
+                            exc_info=True,
+                            slack=self.config.slack_config.enable,
+                        )
+                for coin, order_msgs in coin_order_msgs.items():
+                    conn = self._connections[coin][0]
+                    if len(order_msgs) == 1:
+                        self._send_to_sub_process(conn, order_msgs[0])
+                    else:
+                        self._send_to_sub_process(conn, FtxBatchMessage(order_msgs))
             except asyncio.CancelledError:
                 raise
             except Exception:
@@ -724,17 +861,91 @@ class MainProcess:
                 )
                 await asyncio.sleep(5)
 
+    @staticmethod
+    def _get_backoff_time(fail_count: int, base: float, cap: float) -> float:
+        """Exponential backoff with jitter after consecutive failures"""
+        exponent = min(fail_count - 1, 16)  # past any cap, stop growing 2**exponent
+        return min(cap, base * 2**exponent) + random.uniform(0, base / 2)
+
+    @staticmethod
+    def _parse_ws_order(data: dict) -> FtxOrderMessage:
+        return FtxOrderMessage(
+            id=str(data["id"]),
+            market=data["market"],
+            type=FtxOrderType.LIMIT if data["type"] == "limit" else FtxOrderType.MARKET,
+            side=Side.BUY if data["side"] == "buy" else Side.SELL,
+            size=to_decimal(data["size"]),
+            price=to_decimal(data["price"])
+            if isinstance(data["price"], (float, int))
+            else data["price"],
+            status=FtxOrderStatus.str_entry(data["status"]),
+            filled_size=to_decimal(data["filledSize"]),
+            avg_fill_price=Decimal(str(data["avgFillPrice"]))
+            if data["avgFillPrice"]
+            else None,
+            create_timestamp=iso_to_timestamp(data["createdAt"]),
+        )
+
+    def _is_entry_price_cached(self, market: str) -> bool:
+        cached = self._entry_price_cache.get(market)
+        return (
+            cached is not None and time.time() - cached[1] < self.ENTRY_PRICE_CACHE_TTL
+        )
+
+    async def _get_entry_prices(
+        self, conn: Connection, hedge_pair: FtxHedgePair
+    ) -> Tuple[Decimal, Decimal]:
+        """Sub processes push entry prices on every change, only ask for them in one
+        request when the cached ones are missing or too old"""
+        spot, future = hedge_pair.spot, hedge_pair.future
+        if not (
+            self._is_entry_price_cached(spot) and self._is_entry_price_cached(future)
+        ):
+            coin = hedge_pair.coin
+            if self._receive_entry_price_events.get(coin) is None:
+                self._receive_entry_price_events[coin] = asyncio.Event()
+            event = self._receive_entry_price_events[coin]
+            event.clear()
+            self._send_to_sub_process(
+                conn, FtxEntryPriceBatchRequestMessage([spot, future])
+            )
+            try:
+                async with async_timeout.timeout(1):
+                    await event.wait()
+            finally:
+                event.clear()
+        return self._entry_price_cache[spot][0], self._entry_price_cache[future][0]
+
+    async def _update_summary_entry_prices(
+        self, conn: Connection, summary: FtxHedgePairSummary
+    ):
+        try:
+            (
+                summary.spot_entry_price,
+                summary.future_entry_price,
+            ) = await self._get_entry_prices(conn, summary.hedge_pair)
+        except asyncio.TimeoutError:
+            pass
+
     async def _log_summary_polling_loop(self):
         await asyncio.sleep(60)  # wait for entry price update
+        fail_count = 0
         try:
             while True:
                 try:
                     await self._trading_rules_ready_event.wait()
+                    # latest log summary interval fills
+                    now = time.time()
+                    end_ts = (
+                        now // self.LOG_SUMMARY_INTERVAL * self.LOG_SUMMARY_INTERVAL
+                    )
+                    start_ts = end_ts - self.LOG_SUMMARY_INTERVAL
                     username_task = self.exchange.get_username()
                     account_task = self.exchange.get_account()
                     balances_task = self.exchange.get_balances()
-                    username, account, balances = await asyncio.gather(
-                        username_task, account_task, balances_task
+                    fills_task = self.exchange.get_fills(start_ts, end_ts)
+                    username, account, balances, fills = await asyncio.gather(
+                        username_task, account_task, balances_task, fills_task
                     )
                     positions = account.pop("positions")
                     account_value = to_decimal_or_none(account["totalAccountValue"])
@@ -772,9 +983,10 @@ class MainProcess:
                             continue
                         future_size = to_decimal_or_none(position["netSize"])
                         coin = FtxHedgePair.future_to_coin(future)
-                        if summarys.get(coin):
-                            summarys[coin].future_size = future_size
-                            summarys[coin].future_price_tick = self.trading_rules[
+                        summary = summarys.get(coin)
+                        if summary is not None:
+                            summary.future_size = future_size
+                            summary.future_price_tick = self.trading_rules[
                                 future
                             ].price_tick
                         else:
@@ -788,81 +1000,44 @@ class MainProcess:
                                 )
 
                     # request entry price from sub process
-                    for coin, summary in summarys.items():
-                        if self._connections.get(coin) is None:
-                            continue
-                        spot = summary.hedge_pair.spot
-                        future = summary.hedge_pair.future
-                        conn = self._connections[coin][0]
-                        # update spot entry price
-                        conn.send(FtxEntryPriceRequestMessage(spot))
-                        if self._receive_entry_price_events.get(spot) is None:
-                            self._receive_entry_price_events[spot] = asyncio.Event()
-                        try:
-                            await asyncio.wait_for(
-                                self._receive_entry_price_events[spot].wait(), 1
-                            )
-                        except asyncio.TimeoutError:
-                            continue
-                        else:
-                            summary.spot_entry_price = self._entry_prices[spot]
-                        finally:
-                            self._receive_entry_price_events[spot].clear()
-                        # update future entry price
-                        conn.send(FtxEntryPriceRequestMessage(future))
-                        if self._receive_entry_price_events.get(future) is None:
-                            self._receive_entry_price_events[future] = asyncio.Event()
-                        try:
-                            await asyncio.wait_for(
-                                self._receive_entry_price_events[future].wait(), 1
+                    await asyncio.gather(
+                        *[
+                            self._update_summary_entry_prices(
+                                self._connections[coin][0], summary
                             )
-                        except asyncio.TimeoutError:
-                            continue
-                        else:
-                            summary.future_entry_price = self._entry_prices[future]
-                        finally:
-                            self._receive_entry_price_events[future].clear()
+                            for coin, summary in summarys.items()
+                            if self._connections.get(coin) is not None
+                        ]
+                    )
 
                     # create summary text
-                    text = f"{username}\n"
-                    text += f"Total USD value: ${account_usd_value:,.0f}\n"
-                    text += f"Collateral supply: ${collateral_supply:,.0f}\n"
-                    text += f"Free collateral: $ {free_collateral:,.0f}\n"
-                    text += f"Leverage: {leverage:.2f}x\n"
-                    text += f">USD ${usd_size:,.0f}\n"
+                    parts: List[str] = [
+                        f"{username}\n",
+                        f"Total USD value: ${account_usd_value:,.0f}\n",
+                        f"Collateral supply: ${collateral_supply:,.0f}\n",
+                        f"Free collateral: $ {free_collateral:,.0f}\n",
+                        f"Leverage: {leverage:.2f}x\n",
+                        f">USD ${usd_size:,.0f}\n",
+                    ]
                     for summary in sorted(summarys.values(), reverse=True):
-                        text += f">{summary}\n"
-
-                    # get latest log summary interval fills
-                    now = time.time()
-                    end_ts = (
-                        now // self.LOG_SUMMARY_INTERVAL * self.LOG_SUMMARY_INTERVAL
-                    )
-                    start_ts = end_ts - self.LOG_SUMMARY_INTERVAL
-                    fills = await self.exchange.get_fills(start_ts, end_ts)
+                        parts.append(f">{summary}\n")
 
                     info_map: Dict[str, OpenCloseInfo] = {}
                     for fill in fills:
-                        market = fill["market"]
-                        if FtxHedgePair.is_spot(market):
-                            spot = market
-                            coin = FtxHedgePair.spot_to_coin(spot)
-                            future = FtxHedgePair.spot_to_future(
-                                spot, self.config.season
-                            )
-                        elif FtxHedgePair.is_future(market, self.config.season):
-                            future = market
-                            coin = FtxHedgePair.future_to_coin(future)
-                            spot = FtxHedgePair.future_to_spot(future)
-                        if info_map.get(coin) is None:
-                            info_map[coin] = OpenCloseInfo(
-                                hedge_pair=FtxHedgePair(coin, spot, future),
+                        coin = self._market_to_coin(fill["market"])
+                        if coin is None:
+                            continue
+                        info = info_map.get(coin)
+                        if info is None:
+                            info = info_map[coin] = OpenCloseInfo(
+                                hedge_pair=FtxHedgePair.from_coin(
+                                    coin, self.config.season
+                                ),
                             )
-                        info = info_map[coin]
                         info.fill_entry(fill)
 
                     if len(info_map) > 0:
-                        text += "Open and close info during last hour:\n"
+                        parts.append("Open and close info during last hour:\n")
                         for info in info_map.values():
                             future_trading_rule = self.trading_rules.get(
                                 info.hedge_pair.future
@@ -870,57 +1045,45 @@ class MainProcess:
                             spot_trading_rule = self.trading_rules.get(
                                 info.hedge_pair.spot
                             )
-                            text += f"{info.hedge_pair.future}\n"
+                            parts.append(f"{info.hedge_pair.future}\n")
                             if info.future_open_size > 0 or info.spot_open_size > 0:
-                                if future_trading_rule and info.future_open_price:
-                                    future_open_price = (
-                                        info.future_open_price
-                                        // future_trading_rule.price_tick
-                                        * future_trading_rule.price_tick
-                                    )
-                                else:
-                                    future_open_price = info.future_open_price
-                                if spot_trading_rule and info.spot_open_price:
-                                    spot_open_price = (
-                                        info.spot_open_price
-                                        // spot_trading_rule.price_tick
-                                        * spot_trading_rule.price_tick
-                                    )
-                                else:
-                                    spot_open_price = info.spot_open_price
-                                text += f">Open future: [{future_open_price}, {info.future_open_size}], "
-                                text += (
+                                future_open_price = self._quantize_summary_price(
+                                    info.future_open_price, future_trading_rule
+                                )
+                                spot_open_price = self._quantize_summary_price(
+                                    info.spot_open_price, spot_trading_rule
+                                )
+                                parts.append(
+                                    f">Open future: [{future_open_price}, {info.future_open_size}], "
+                                )
+                                parts.append(
                                     f"spot: [{spot_open_price}, {info.spot_open_size}]"
                                 )
                                 if future_open_price and spot_open_price:
                                     basis = future_open_price - spot_open_price
-                                    text += f", basis: {basis}"
-                                text += "\n"
+                                    parts.append(f", basis: {basis}")
+                                parts.append("\n")
                             if info.future_close_size > 0 or info.spot_close_size > 0:
-                                if future_trading_rule and info.future_close_price:
-                                    future_close_price = (
-                                        info.future_close_price
-                                        // future_trading_rule.price_tick
-                                        * future_trading_rule.price_tick
-                                    )
-                                else:
-                                    future_close_price = info.future_close_price
-                                if spot_trading_rule and info.spot_close_price:
-                                    spot_close_price = (
-                                        info.spot_close_price
-                                        // spot_trading_rule.price_tick
-                                        * spot_trading_rule.price_tick
-                                    )
-                                else:
-                                    spot_close_price = info.spot_close_price
-                                text += f">Close future: [{future_close_price}, {info.future_close_size}], "
-                                text += f"spot: [{spot_close_price}, {info.spot_close_size}]"
+                                future_close_price = self._quantize_summary_price(
+                                    info.future_close_price, future_trading_rule
+                                )
+                                spot_close_price = self._quantize_summary_price(
+                                    info.spot_close_price, spot_trading_rule
+                                )
+                                parts.append(
+                                    f">Close future: [{future_close_price}, {info.future_close_size}], "
+                                )
+                                parts.append(
+                                    f"spot: [{spot_close_price}, {info.spot_close_size}]"
+                                )
                                 if future_close_price and spot_close_price:
                                     basis = future_close_price - spot_close_price
-                                    text += f", basis: {basis}"
-                                text += "\n"
+                                    parts.append(f", basis: {basis}")
+                                parts.append("\n")
 
+                    text = "".join(parts)
                     self.logger.info(text, slack=self.config.slack_config.enable)
+                    fail_count = 0
 
                     # wait next round
                     now = time.time()
@@ -936,10 +1099,18 @@ class MainProcess:
                         exc_info=True,
                         slack=self.config.slack_config.enable,
                     )
-                    await asyncio.sleep(10)
+                    fail_count += 1
+                    await asyncio.sleep(self._get_backoff_time(fail_count, 10, 600))
         except asyncio.CancelledError:
             raise
 
+    def _quantize_summary_price(
+        self, price: Decimal, trading_rule: FtxTradingRule
+    ) -> Decimal:
+        if trading_rule is None or not price:
+            return price
+        return self.exchange.quantize_order_price(price, trading_rule.price_tick)
+
     async def _apply_funding_service(self):
         if not self.config.funding_service_config.enable:
             return
@@ -949,9 +1120,16 @@ class MainProcess:
                 exchange="ftx",
                 api_key=self.config.api_key,
             )
-        balances: List[dict] = await self.exchange.get_balances()
-        usd_info: dict = next(b for b in balances if b["coin"] == "USD")
-        usd_borrow: Decimal = Decimal(str(usd_info["spotBorrow"]))
+        # leverage info is kept fresh by the account info polling loop, only fetch the
+        # latest account state when the leverage is out of the band
+        if (
+            self.config.funding_service_config.leverage_lower_bound
+            <= self.leverage_info.current_leverage
+            <= self.config.funding_service_config.leverage_upper_bound
+        ):
+            return
+        usd_info: dict = await self._get_usd_balance()
+        usd_borrow: Decimal = to_decimal(usd_info["spotBorrow"])
         account_info = await self.exchange.get_account()
         self._update_account_info(account_info)
         current_leverage: Decimal = self.leverage_info.current_leverage
@@ -963,8 +1141,8 @@ class MainProcess:
                 funding_account_usd_info: dict = (
                     await self._fs_client.get_funding_account_balance_by_coin("USD")
                 )
-                funding_account_usd_balance: Decimal = Decimal(
-                    str(funding_account_usd_info["balance"])
+                funding_account_usd_balance: Decimal = to_decimal(
+                    funding_account_usd_info["balance"]
                 )
             except Exception:
                 self.logger.error(
@@ -1012,35 +1190,21 @@ class MainProcess:
                         resp["worker_id"]
                     )
                     if status == WORKER_STATUS_FINISH:
-                        username = await self.exchange.get_username()
-                        balances: List[dict] = await self.exchange.get_balances()
-                        usd_info: dict = next(b for b in balances if b["coin"] == "USD")
-                        new_usd_borrow: Decimal = Decimal(str(usd_info["spotBorrow"]))
-                        account_info = await self.exchange.get_account()
-                        self._update_account_info(account_info)
-                        new_current_leverage: Decimal = (
-                            self.leverage_info.current_leverage
-                        )
-                        new_position: Decimal = self.leverage_info.position_value
-                        new_account_value: Decimal = self.leverage_info.account_value
-                        log_msg: str = f"{username} requested deposit ${deposit_amount:.2f} completed\n"
-                        log_msg += (
-                            f">Account value {account_value} -> {new_account_value}\n"
-                        )
-                        log_msg += f">Position value {position} -> {new_position}\n"
-                        log_msg += (
-                            f">USD spot borrow {usd_borrow} -> {new_usd_borrow}\n"
+                        await self._log_funding_service_result(
+                            f"deposit ${deposit_amount:.2f}",
+                            account_value,
+                            position,
+                            usd_borrow,
+                            current_leverage,
                         )
-                        log_msg += f">Leverage {current_leverage}X -> {new_current_leverage}X\n"
-                        self.logger.info(log_msg, slack=self.config.slack_config.enable)
                     elif status == WORKER_STATUS_PROC:
                         self.logger.warning(
                             "Funding service deposit is working in progress",
                             slack=self.config.slack_config.enable,
                         )
         elif current_leverage < self.config.funding_service_config.leverage_lower_bound:
-            available_usd_for_withdraw: Decimal = Decimal(
-                str(usd_info["availableForWithdrawal"])
+            available_usd_for_withdraw: Decimal = to_decimal(
+                usd_info["availableForWithdrawal"]
             )
             available_usd_for_withdraw = max(
                 Decimal(0),
@@ -1068,27 +1232,13 @@ class MainProcess:
                         resp["worker_id"]
                     )
                     if status == WORKER_STATUS_FINISH:
-                        username = await self.exchange.get_username()
-                        balances: List[dict] = await self.exchange.get_balances()
-                        usd_info: dict = next(b for b in balances if b["coin"] == "USD")
-                        new_usd_borrow: Decimal = Decimal(str(usd_info["spotBorrow"]))
-                        account_info = await self.exchange.get_account()
-                        self._update_account_info(account_info)
-                        new_current_leverage: Decimal = (
-                            self.leverage_info.current_leverage
+                        await self._log_funding_service_result(
+                            f"withdraw ${withdraw_amount:.2f}",
+                            account_value,
+                            position,
+                            usd_borrow,
+                            current_leverage,
                         )
-                        new_position: Decimal = self.leverage_info.position_value
-                        new_account_value: Decimal = self.leverage_info.account_value
-                        log_msg: str = f"{username} requested withdraw ${withdraw_amount:.2f} completed\n"
-                        log_msg += (
-                            f">Account value {account_value} -> {new_account_value}\n"
-                        )
-                        log_msg += f">Position value {position} -> {new_position}\n"
-                        log_msg += (
-                            f">USD spot borrow {usd_borrow} -> {new_usd_borrow}\n"
-                        )
-                        log_msg += f">Leverage {current_leverage}X -> {new_current_leverage}X\n"
-                        self.logger.info(log_msg, slack=self.config.slack_config.enable)
                     elif status == WORKER_STATUS_PROC:
                         self.logger.warning(
                             "Funding service withdraw is working in progress",
@@ -1112,19 +1262,44 @@ class MainProcess:
         except asyncio.CancelledError:
             raise
 
+    async def _log_funding_service_result(
+        self,
+        action: str,
+        account_value: Decimal,
+        position: Decimal,
+        usd_borrow: Decimal,
+        current_leverage: Decimal,
+    ):
+        """Log the account state before and after a completed deposit or withdraw"""
+        username, usd_info, account_info = await asyncio.gather(
+            self.exchange.get_username(),
+            self._get_usd_balance(),
+            self.exchange.get_account(),
+        )
+        new_usd_borrow: Decimal = to_decimal(usd_info["spotBorrow"])
+        self._update_account_info(account_info)
+        new_current_leverage: Decimal = self.leverage_info.current_leverage
+        new_position: Decimal = self.leverage_info.position_value
+        new_account_value: Decimal = self.leverage_info.account_value
+        log_msg: str = f"{username} requested {action} completed\n"
+        log_msg += f">Account value {account_value} -> {new_account_value}\n"
+        log_msg += f">Position value {position} -> {new_position}\n"
+        log_msg += f">USD spot borrow {usd_borrow} -> {new_usd_borrow}\n"
+        log_msg += f">Leverage {current_leverage}X -> {new_current_leverage}X\n"
+        self.logger.info(log_msg, slack=self.config.slack_config.enable)
+
+    async def _get_usd_balance(self) -> dict:
+        balances: List[dict] = await self.exchange.get_balances()
+        for balance in balances:
+            if balance["coin"] == "USD":
+                return balance
+        raise ValueError("USD balance is not found")
+
     def _drop_outdated_deposit_and_withdraw_histroy_cache(self):
         now: float = time.time()
-        is_outdated: Callable[[float, dict], bool] = (
-            lambda current_ts, history: current_ts
-            - dateutil.parser.parse(history["time"]).timestamp()
-            > 86400
-        )
-        self._deposit_history_cache = [
-            his for his in self._deposit_history_cache if not is_outdated(now, his)
-        ]
-        self._withdraw_history_cache = [
-            his for his in self._withdraw_history_cache if not is_outdated(now, his)
-        ]
+        for cache in (self._deposit_history_cache, self._withdraw_history_cache):
+            while len(cache) > 0 and now - cache[0]["_ts"] > 86400:
+                cache.popleft()
 
     async def _get_last_24h_net_deposit(self) -> Decimal:
         self._drop_outdated_deposit_and_withdraw_histroy_cache()
@@ -1133,45 +1308,37 @@ class MainProcess:
         if len(self._deposit_history_cache) == 0:
             start_ts: float = end_ts - 86400
         else:
-            start_ts: float = (
-                max(
-                    [
-                        dateutil.parser.parse(his["time"])
-                        for his in self._deposit_history_cache
-                    ]
-                ).timestamp()
-                + 1
-            )
+            # the cache is sorted, the newest record is the last one
+            start_ts: float = self._deposit_history_cache[-1]["_ts"] + 1
         deposit_history = await self.exchange.get_deposit_history(start_ts, end_ts)
-        self._deposit_history_cache.extend(deposit_history)
+        self._deposit_history_cache.extend(self._prepare_history(deposit_history))
 
         if len(self._withdraw_history_cache) == 0:
             start_ts: float = end_ts - 86400
         else:
-            start_ts: float = (
-                max(
-                    [
-                        dateutil.parser.parse(his["time"])
-                        for his in self._withdraw_history_cache
-                    ]
-                ).timestamp()
-                + 1
-            )
+            start_ts: float = self._withdraw_history_cache[-1]["_ts"] + 1
         withdraw_history = await self.exchange.get_withdraw_history(start_ts, end_ts)
-        self._withdraw_history_cache.extend(withdraw_history)
-
-        net_deposit: Decimal = Decimal(0)
-        for history in self._deposit_history_cache:
-            coin: str = history["coin"]
-            if coin in ("USD", "USDC", "BUSD"):
-                size: Decimal = Decimal(str(history["size"]))
-                net_deposit += size
-        for history in self._withdraw_history_cache:
-            coin: str = history["coin"]
-            if coin in ("USD", "USDC", "BUSD"):
-                size: Decimal = Decimal(str(history["size"]))
-                net_deposit -= size
-        return max(Decimal(0), net_deposit)
+        self._withdraw_history_cache.extend(self._prepare_history(withdraw_history))
+
+        deposit: Decimal = sum(
+            (his["_usd_size"] for his in self._deposit_history_cache), Decimal(0)
+        )
+        withdraw: Decimal = sum(
+            (his["_usd_size"] for his in self._withdraw_history_cache), Decimal(0)
+        )
+        return max(Decimal(0), deposit - withdraw)
+
+    @staticmethod
+    def _prepare_history(history: List[dict]) -> List[dict]:
+        """Parse time and USD size once when cached, the cache is filtered and summed
+        on every call. Sorted by time, they are fetched after every cached record"""
+        for his in history:
+            his["_ts"] = iso_to_timestamp(his["time"])
+            his["_usd_size"] = (
+                to_decimal(his["size"]) if his["coin"] in USD_COINS else Decimal(0)
+            )
+        history.sort(key=lambda his: his["_ts"])
+        return history
 
     async def run(self):
         self.start_network()
@@ -12,21 +12,22 @@ from multiprocessing.connection import Connection
 from signal import SIGTERM, signal
 from typing import Dict, List
 
-import dateutil.parser
+import async_timeout
 import uvloop
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from cachetools import TTLCache
 from tzlocal import get_localzone_name
 
-from src.common import Config
+from src.common import Config, iso_to_timestamp, to_decimal
 from src.exchange.exchange_data_type import Side, TradeType
 from src.exchange.ftx.ftx_client import FtxExchange
 from src.exchange.ftx.ftx_data_type import (Ftx_EWMA_InterestRate,
+                                            FtxBatchMessage,
                                             FtxCandleResolution,
                                             FtxCollateralWeight,
                                             FtxCollateralWeightMessage,
-                                            FtxEntryPriceRequestMessage,
-                                            FtxEntryPriceResponseMessage,
+                                            FtxEntryPriceBatchRequestMessage,
+                                            FtxEntryPriceBatchResponseMessage,
                                             FtxFeeRate, FtxFeeRateMessage,
                                             FtxFundOpenFilledMessage,
                                             FtxFundRequestMessage,
@@ -78,7 +79,6 @@ class SubProcess:
         self.logger = self._init_get_logger()
 
         self._loop = asyncio.get_event_loop()
-        self._main_process_notify_event = asyncio.Event()
 
         self.spot_trading_rule: FtxTradingRule = None
         self.future_trading_rule: FtxTradingRule = None
@@ -94,7 +94,6 @@ class SubProcess:
         )
         self.exchange.ws_register_ticker_channel([hedge_pair.spot, hedge_pair.future])
 
-        self._consume_main_process_msg_task: asyncio.Task = None
         self._listen_for_ws_task: asyncio.Task = None
         self._indicator_polling_loop_task: asyncio.Task = None
         self._entry_price_polling_loop_task: asyncio.Task = None
@@ -199,7 +198,7 @@ class SubProcess:
         except StopIteration:
             self.spot_position_size = Decimal(0)
         else:
-            self.spot_position_size = Decimal(str(balance["total"]))
+            self.spot_position_size = to_decimal(balance["total"])
         self.logger.info(
             f"{self.hedge_pair.coin} position size is {self.spot_position_size}"
         )
@@ -212,7 +211,7 @@ class SubProcess:
         except StopIteration:
             self.future_position_size = Decimal(0)
         else:
-            self.future_position_size = Decimal(str(position["netSize"]))
+            self.future_position_size = to_decimal(position["netSize"])
         self.logger.info(
             f"{self.hedge_pair.future} position size is {self.future_position_size}"
         )
@@ -391,6 +390,24 @@ class SubProcess:
             if self.spot_entry_price and self.future_entry_price:
                 basis = self.future_entry_price - self.spot_entry_price
                 self.logger.info(f"Update {self.hedge_pair.coin} basis: {basis}")
+            self._push_entry_prices()
+
+    def _push_entry_prices(self):
+        """Push entry prices to the main process, which caches them for the summary"""
+        self._send_entry_prices([self.hedge_pair.spot, self.hedge_pair.future])
+
+    def _send_entry_prices(self, markets: List[str]):
+        entry_prices = {}
+        for market in markets:
+            if market == self.hedge_pair.spot:
+                entry_prices[market] = self.spot_entry_price
+            elif market == self.hedge_pair.future:
+                entry_prices[market] = self.future_entry_price
+            else:
+                entry_prices[market] = None
+        self.conn.send(
+            FtxEntryPriceBatchResponseMessage(self.hedge_pair.coin, entry_prices)
+        )
 
     async def _entry_price_polling_loop(self):
         while True:
@@ -415,8 +432,8 @@ class SubProcess:
             temp_position_size = position_size
             my_fills = []
             for fill in reversed(fills):
-                size = Decimal(str(fill["size"]))
-                price = Decimal(str(fill["price"]))
+                size = to_decimal(fill["size"])
+                price = to_decimal(fill["price"])
                 if fill["side"] == "buy":
                     prev_position_size = temp_position_size - size
                     if prev_position_size <= 0:
@@ -450,8 +467,8 @@ class SubProcess:
             temp_position_size = position_size
             my_fills = []
             for fill in reversed(fills):
-                size = Decimal(str(fill["size"]))
-                price = Decimal(str(fill["price"]))
+                size = to_decimal(fill["size"])
+                price = to_decimal(fill["price"])
                 if fill["side"] == "sell":
                     prev_position_size = temp_position_size + size
                     if prev_position_size >= 0:
@@ -544,14 +561,11 @@ class SubProcess:
 
     async def _init_update_future_expiry(self):
         result = await self.exchange.get_future(self.hedge_pair.future)
-        self.future_expiry_ts = dateutil.parser.parse(result["expiry"]).timestamp()
+        self.future_expiry_ts = iso_to_timestamp(result["expiry"])
         self._future_expiry_ts_update_event.set()
 
     def start_network(self):
-        if self._consume_main_process_msg_task is None:
-            self._consume_main_process_msg_task = asyncio.create_task(
-                self._consume_main_process_msg()
-            )
+        self._loop.add_reader(self.conn.fileno(), self._on_main_process_msg_ready)
         if self._listen_for_ws_task is None:
             self._listen_for_ws_task = asyncio.create_task(
                 self.exchange.ws_start_network()
@@ -571,9 +585,7 @@ class SubProcess:
         asyncio.create_task(self._init_update_future_expiry())
 
     def stop_network(self):
-        if self._consume_main_process_msg_task is not None:
-            self._consume_main_process_msg_task.cancel()
-            self._consume_main_process_msg_task = None
+        self._loop.remove_reader(self.conn.fileno())
         if self._listen_for_ws_task is not None:
             self._listen_for_ws_task.cancel()
             self._listen_for_ws_task = None
@@ -587,87 +599,94 @@ class SubProcess:
             self._otc_clean_up_polling_loop_task.cancel()
             self._otc_clean_up_polling_loop_task = None
 
-    async def _consume_main_process_msg(self):
-        self._loop.add_reader(self.conn.fileno(), self._main_process_notify_event.set)
-        while True:
-            if not self.conn.poll():
-                await self._main_process_notify_event.wait()
-            msg = self.conn.recv()
-            if type(msg) is FtxTradingRuleMessage:
-                trading_rule = msg.trading_rule
-                if trading_rule.symbol == self.hedge_pair.spot:
-                    self.spot_trading_rule = trading_rule
-                elif trading_rule.symbol == self.hedge_pair.future:
-                    self.future_trading_rule = trading_rule
-                self.logger.debug(
-                    f"{self.hedge_pair.coin} Receive trading rule message: {trading_rule}"
-                )
-                # update the least common multiple of min order size
-                if (
-                    self.spot_trading_rule is not None
-                    and self.future_trading_rule is not None
-                ):
-                    lcm_min_order_size = max(
-                        self.spot_trading_rule.min_order_size,
-                        self.future_trading_rule.min_order_size,
-                    )
-                    assert (
-                        lcm_min_order_size % self.spot_trading_rule.min_order_size == 0
-                    ), f"{lcm_min_order_size} is not a multiple of spot min order size {self.spot_trading_rule.min_order_size}"
-                    assert (
-                        lcm_min_order_size % self.future_trading_rule.min_order_size
-                        == 0
-                    ), f"{lcm_min_order_size} is not a multiple of future min order size {self.future_trading_rule.min_order_size}"
-                    self.combined_trading_rule = CombinedTradingRule(lcm_min_order_size)
-                    self._combined_trading_rule_update_event.set()
-            elif type(msg) is FtxInterestRateMessage:
-                self.ewma_interest_rate = msg.ewma_interest_rate
-                self.logger.debug(
-                    f"{self.hedge_pair.coin} Receive interest rate message: {msg.ewma_interest_rate}"
-                )
-            elif type(msg) is FtxFeeRateMessage:
-                self.fee_rate = msg.fee_rate
-                self.logger.debug(
-                    f"{self.hedge_pair.coin} Receive fee rate message: {msg.fee_rate}"
-                )
-            elif type(msg) is FtxCollateralWeightMessage:
-                self.collateral_weight = msg.collateral_weight
-                self.logger.debug(
-                    f"{self.hedge_pair.coin} Receive collateral weight message: {msg.collateral_weight}"
-                )
-            elif type(msg) is FtxLeverageMessage:
-                self.leverage_info = msg.leverage
-                self.logger.debug(
-                    f"{self.hedge_pair.coin} Receive leverage message: {msg.leverage}"
-                )
-            elif type(msg) is FtxFundResponseMessage:
-                self._fund_manager_response_message = msg
-                self._fund_manager_response_event.set()
-            elif type(msg) is FtxOrderMessage:
-                self.logger.debug(
-                    f"{self.hedge_pair.coin} Receive ws order message: {msg}"
-                )
-                order_id = msg.id
-                self._ws_orders[order_id] = msg
-                if not self._ws_orders_events.get(order_id):
-                    self._ws_orders_events[order_id] = asyncio.Event()
-                if msg.status == FtxOrderStatus.CLOSED:
-                    self._ws_orders_events[order_id].set()
-                    self._update_state_when_order_closed(msg)
-            elif type(msg) is FtxEntryPriceRequestMessage:
-                market = msg.market
-                if market == self.hedge_pair.spot:
-                    entry_price = self.spot_entry_price
-                elif market == self.hedge_pair.future:
-                    entry_price = self.future_entry_price
+    def _on_main_process_msg_ready(self):
+        """Reader callback of the main process pipe, drain all the ready messages"""
+        try:
+            while self.conn.poll():
+                msg = self.conn.recv()
+                if type(msg) is FtxBatchMessage:
+                    for sub_msg in msg.messages:
+                        self._handle_main_process_msg(sub_msg)
                 else:
-                    entry_price = None
-                self.conn.send(FtxEntryPriceResponseMessage(market, entry_price))
-            else:
-                self.logger.warning(
-                    f"{self.hedge_pair.coin} receive unknown message: {msg}"
+                    self._handle_main_process_msg(msg)
+        except (EOFError, OSError):
+            # main process is gone, nothing more to read
+            self._loop.remove_reader(self.conn.fileno())
+            self.logger.error(
+                f"{self.hedge_pair.coin} Connection to main process is closed.",
+                exc_info=True,
+            )
+        except Exception:
+            self.logger.error(
+                f"{self.hedge_pair.coin} Error while consume main process message.",
+                exc_info=True,
+            )
+
+    def _handle_main_process_msg(self, msg):
+        if type(msg) is FtxTradingRuleMessage:
+            trading_rule = msg.trading_rule
+            if trading_rule.symbol == self.hedge_pair.spot:
+                self.spot_trading_rule = trading_rule
+            elif trading_rule.symbol == self.hedge_pair.future:
+                self.future_trading_rule = trading_rule
+            self.logger.debug(
+                f"{self.hedge_pair.coin} Receive trading rule message: {trading_rule}"
+            )
+            # update the least common multiple of min order size
+            if (
+                self.spot_trading_rule is not None
+                and self.future_trading_rule is not None
+            ):
+                lcm_min_order_size = max(
+                    self.spot_trading_rule.min_order_size,
+                    self.future_trading_rule.min_order_size,
                 )
-            self._main_process_notify_event.clear()
+                assert (
+                    lcm_min_order_size % self.spot_trading_rule.min_order_size == 0
+                ), f"{lcm_min_order_size} is not a multiple of spot min order size {self.spot_trading_rule.min_order_size}"
+                assert (
+                    lcm_min_order_size % self.future_trading_rule.min_order_size == 0
+                ), f"{lcm_min_order_size} is not a multiple of future min order size {self.future_trading_rule.min_order_size}"
+                self.combined_trading_rule = CombinedTradingRule(lcm_min_order_size)
+                self._combined_trading_rule_update_event.set()
+        elif type(msg) is FtxInterestRateMessage:
+            self.ewma_interest_rate = msg.ewma_interest_rate
+            self.logger.debug(
+                f"{self.hedge_pair.coin} Receive interest rate message: {msg.ewma_interest_rate}"
+            )
+        elif type(msg) is FtxFeeRateMessage:
+            self.fee_rate = msg.fee_rate
+            self.logger.debug(
+                f"{self.hedge_pair.coin} Receive fee rate message: {msg.fee_rate}"
+            )
+        elif type(msg) is FtxCollateralWeightMessage:
+            self.collateral_weight = msg.collateral_weight
+            self.logger.debug(
+                f"{self.hedge_pair.coin} Receive collateral weight message: {msg.collateral_weight}"
+            )
+        elif type(msg) is FtxLeverageMessage:
+            self.leverage_info = msg.leverage
+            self.logger.debug(
+                f"{self.hedge_pair.coin} Receive leverage message: {msg.leverage}"
+            )
+        elif type(msg) is FtxFundResponseMessage:
+            self._fund_manager_response_message = msg
+            self._fund_manager_response_event.set()
+        elif type(msg) is FtxOrderMessage:
+            self.logger.debug(f"{self.hedge_pair.coin} Receive ws order message: {msg}")
+            order_id = msg.id
+            self._ws_orders[order_id] = msg
+            if not self._ws_orders_events.get(order_id):
+                self._ws_orders_events[order_id] = asyncio.Event()
+            if msg.status == FtxOrderStatus.CLOSED:
+                self._ws_orders_events[order_id].set()
+                self._update_state_when_order_closed(msg)
+        elif type(msg) is FtxEntryPriceBatchRequestMessage:
+            self._send_entry_prices(msg.markets)
+        else:
+            self.logger.warning(
+                f"{self.hedge_pair.coin} receive unknown message: {msg}"
+            )
 
     def _update_state_when_order_closed(self, msg: FtxOrderMessage):
         if msg.filled_size == 0:
@@ -702,6 +721,7 @@ class SubProcess:
                 if new_size == 0:
                     self.future_entry_price = None
             self.future_position_size = new_size
+        self._push_entry_prices()
 
     async def _indicator_polling_loop(self):
         while True:
@@ -782,9 +802,8 @@ class SubProcess:
 
             # await fund response
             try:
-                await asyncio.wait_for(
-                    self._fund_manager_response_event.wait(), timeout=1,
-                )
+                async with async_timeout.timeout(1):
+                    await self._fund_manager_response_event.wait()
             except asyncio.TimeoutError:
                 self.logger.warning(
                     f"{self.hedge_pair.coin} request fund for open position timeout."
@@ -1091,7 +1110,8 @@ class SubProcess:
         event = self._ws_orders_events.get(order_id)
         if event is not None:
             try:
-                await asyncio.wait_for(event.wait(), timeout)
+                async with async_timeout.timeout(timeout):
+                    await event.wait()
             except asyncio.TimeoutError:
                 self.logger.warning(
                     f"Wait order {order_id} event timeout: {timeout}s, try rest api get order"
@@ -1106,16 +1126,16 @@ class SubProcess:
             market=data["market"],
             type=FtxOrderType.LIMIT if data["type"] == "limit" else FtxOrderType.MARKET,
             side=Side.BUY if data["side"] == "buy" else Side.SELL,
-            size=Decimal(str(data["size"])),
-            price=Decimal(str(data["price"]))
+            size=to_decimal(data["size"]),
+            price=to_decimal(data["price"])
             if isinstance(data["price"], (float, int))
             else data["price"],
             status=FtxOrderStatus.str_entry(data["status"]),
-            filled_size=Decimal(str(data["filledSize"])),
+            filled_size=to_decimal(data["filledSize"]),
             avg_fill_price=Decimal(str(data["avgFillPrice"]))
             if data["avgFillPrice"]
             else None,
-            create_timestamp=dateutil.parser.parse(data["createdAt"]).timestamp(),
+            create_timestamp=iso_to_timestamp(data["createdAt"]),
         )
         if order_msg.status == FtxOrderStatus.CLOSED:
             self._update_state_when_order_closed(order_msg)
@@ -1,78 +1,129 @@
 import asyncio
 from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
+from src.common import to_decimal
 from src.exchange.ftx.ftx_data_type import (FtxFundOpenFilledMessage,
                                             FtxFundRequestMessage,
                                             FtxFundResponseMessage,
                                             FtxLeverageInfo)
 
+ZERO = Decimal(0)
 
-@dataclass
+
+@dataclass(slots=True)
 class FundManager:
     leverage_limit: Decimal = None
-    free_collateral: Decimal = Decimal(0)
+    free_collateral: Decimal = ZERO
     collateral_freeze: Dict[str, Decimal] = field(
-        default_factory=lambda: dict()
+        default_factory=dict
     )  # use coin as the key
-    leverage_info: FtxLeverageInfo = FtxLeverageInfo()
-    lock: asyncio.Lock = asyncio.Lock()
+    _total_freeze: Decimal = field(
+        default=ZERO, init=False
+    )  # running sum of collateral_freeze
+    leverage_info: FtxLeverageInfo = field(default_factory=FtxLeverageInfo)
+    _leverage_collateral: Decimal = field(
+        default=ZERO, init=False
+    )  # collateral allowed by leverage_limit, cached per leverage_info
+    _last_account_raw: Optional[Tuple[float, float, float]] = field(
+        default=None, init=False
+    )  # raw leverage, account value and position size of leverage_info
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    _leverage_limit_minus_one: Decimal = field(default=None, init=False)
+
+    def __post_init__(self):
+        if self.leverage_limit is not None:
+            self._leverage_limit_minus_one = self.leverage_limit - 1
 
     async def update_account_state(self, account_info: dict):
-        free_collateral = Decimal(str(account_info["freeCollateral"]))
-        max_leverage = Decimal(str(account_info["leverage"]))
-        account_value = Decimal(str(account_info["totalAccountValue"]))
-        position_value = Decimal(str(account_info["totalPositionSize"]))
-        current_leverage = position_value / account_value
-        leverage_info = FtxLeverageInfo(
-            max_leverage, account_value, position_value, current_leverage
+        free_collateral = to_decimal(account_info["freeCollateral"])
+        account_raw = (
+            account_info["leverage"],
+            account_info["totalAccountValue"],
+            account_info["totalPositionSize"],
         )
+        if account_raw == self._last_account_raw:
+            # leverage info is unchanged, skip rebuilding it
+            leverage_info = self.leverage_info
+            leverage_collateral = self._leverage_collateral
+        else:
+            max_leverage = to_decimal(account_info["leverage"])
+            account_value = to_decimal(account_info["totalAccountValue"])
+            position_value = to_decimal(account_info["totalPositionSize"])
+            current_leverage = position_value / account_value
+            leverage_info = FtxLeverageInfo(
+                max_leverage, account_value, position_value, current_leverage
+            )
+            if self.leverage_limit is not None:
+                leverage_collateral = self._get_collateral_by_leverage(leverage_info)
+            else:
+                leverage_collateral = ZERO
         async with self.lock:
-            self.free_collateral = free_collateral
-            for freeze_amount in self.collateral_freeze.values():
-                self.free_collateral -= freeze_amount
-            self.free_collateral = max(Decimal(0), self.free_collateral)
+            free_collateral -= self._total_freeze
+            self.free_collateral = free_collateral if free_collateral > 0 else ZERO
             self.leverage_info = leverage_info
+            self._leverage_collateral = leverage_collateral
+            self._last_account_raw = account_raw
 
     async def request_for_budget(
         self, request: FtxFundRequestMessage
     ) -> FtxFundResponseMessage:
+        # reject without waiting for the lock, rejecting does not change any state
+        if self._get_available_collateral() <= 0:
+            return FtxFundResponseMessage(coin=request.coin, fund_supply=ZERO)
         async with self.lock:
-            if self.leverage_limit is not None:
-                collateral = self._get_free_collateral_with_leverage_limit()
-            else:
-                collateral = self.free_collateral
+            # re-validate, the state may have changed while waiting for the lock
+            collateral = self._get_available_collateral()
             if collateral <= 0:
-                return FtxFundResponseMessage(coin=request.coin, fund_supply=Decimal(0))
+                fund_supply = ZERO
             elif request.fund_needed < collateral:
                 # handle collateral change
                 fund_supply = request.fund_needed
-                self.collateral_freeze[request.coin] = fund_supply
+                self._freeze(request.coin, fund_supply)
                 self.free_collateral -= fund_supply
-                return FtxFundResponseMessage(
-                    coin=request.coin, fund_supply=fund_supply
-                )
             else:
                 # handle collateral change
                 fund_supply = collateral
-                self.collateral_freeze[request.coin] = fund_supply
-                self.free_collateral = Decimal(0)
-                return FtxFundResponseMessage(
-                    coin=request.coin, fund_supply=fund_supply
-                )
+                self._freeze(request.coin, fund_supply)
+                self.free_collateral = ZERO
+        return FtxFundResponseMessage(coin=request.coin, fund_supply=fund_supply)
+
+    def _freeze(self, coin: str, amount: Decimal):
+        # a new request of the same coin replaces its previous freeze
+        self._total_freeze += amount - self.collateral_freeze.get(coin, ZERO)
+        self.collateral_freeze[coin] = amount
+
+    def _get_available_collateral(self) -> Decimal:
+        if self.leverage_limit is not None:
+            return self._get_free_collateral_with_leverage_limit()
+        else:
+            return self.free_collateral
+
+    def _get_collateral_by_leverage(self, leverage_info: FtxLeverageInfo) -> Decimal:
+        return (
+            self.leverage_limit * leverage_info.account_value
+            - leverage_info.position_value
+        ) / self._leverage_limit_minus_one
 
     def _get_free_collateral_with_leverage_limit(self):
-        available_collateral = (
-            self.leverage_limit * self.leverage_info.account_value
-            - self.leverage_info.position_value
-        ) / (self.leverage_limit - 1)
-        return max(Decimal(0), min(available_collateral, self.free_collateral))
+        collateral = self._leverage_collateral
+        if collateral > self.free_collateral:
+            collateral = self.free_collateral
+        return collateral if collateral > 0 else ZERO
 
     async def handle_open_order_filled(self, msg: FtxFundOpenFilledMessage):
         async with self.lock:
-            freeze_amount = self.collateral_freeze.get(msg.coin, Decimal(0))
+            freeze_amount = self.collateral_freeze.pop(msg.coin, ZERO)
+            self._total_freeze -= freeze_amount
             # handle collateral change in freeze
             self.free_collateral += freeze_amount
             # handle collateral change
             self.free_collateral -= msg.fund_used
+
+    async def release_freeze(self, coin: str):
+        """Give back the collateral frozen for a coin whose sub process is gone"""
+        async with self.lock:
+            freeze_amount = self.collateral_freeze.pop(coin, ZERO)
+            self._total_freeze -= freeze_amount
+            self.free_collateral += freeze_amount
@@ -1,6 +1,6 @@
+import multiprocessing as mp
 import time
 from dataclasses import dataclass
-from multiprocessing.managers import SyncManager
 
 
 @dataclass
@@ -10,16 +10,16 @@ class RateLimitConfig:
 
 
 class RateLimiter:
-    """Rate limiter shared memory among processes by utilizing multiprocessing.Manager()
+    """Rate limiter shared memory among processes by utilizing multiprocessing.Array
 
-    Example:
-    import multiprocessing as mp
+    The latest `limit` timestamps are kept in a ring buffer, it is ok to process when
+    the oldest one is expired.
 
+    Example:
     # initialization
-    manager = mp.Manager()
     interval = 0.2  # seconds
     limit = 7
-    rate_limiter = RateLimiter(manager, interval, limit)
+    rate_limiter = RateLimiter(interval, limit)
 
     # check whether it is ok to process
     if rate_limiter.ok:
@@ -27,40 +27,31 @@ class RateLimiter:
     else:
         ...
 
-    # add record to timestamps list
+    # add record to timestamps ring buffer
     your_own_fn_that_consume_rate_limit(...)
     rate_limiter.add_record()
     """
 
-    def __init__(self, manager: SyncManager, interval: float, limit: int):
+    def __init__(self, interval: float, limit: int):
         """
-        :param manager: A multiprocessing.Manager() that create shared list and Lock()
         :param limit: A total number of calls permitted within interval period
         :param interval: The time interval in seconds
         """
         self.interval = interval
         self.limit = limit
-        self.ts_list = manager.list()
-        self.lock = manager.Lock()
-
-    def drop_expired(self):
-        """Drop timestamps in self.ts_list that are expired"""
-        now = time.time()
-        for ts in list(self.ts_list):
-            if now - ts > self.interval:
-                self.ts_list.remove(ts)
-            else:
-                break
+        self.ts_ring = mp.Array("d", limit, lock=False)
+        self.head = mp.Value("i", 0, lock=False)  # index of the oldest timestamp
+        self.lock = mp.Lock()
 
     def add_record(self, new_ts: float = None):
         if new_ts is None:
             new_ts = time.time()
         with self.lock:
-            self.drop_expired()
-            self.ts_list.append(new_ts)
+            self.ts_ring[self.head.value] = new_ts
+            self.head.value = (self.head.value + 1) % self.limit
 
     @property
     def ok(self) -> bool:
+        now = time.time()
         with self.lock:
-            self.drop_expired()
-        return len(self.ts_list) < self.limit
+            return now - self.ts_ring[self.head.value] > self.interval